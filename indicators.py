@@ -0,0 +1,255 @@
+import streamlit as st
+import yfinance as yf
+from yfinance.exceptions import YFException, YFRateLimitError
+from curl_cffi.requests.exceptions import RequestException
+import pandas as pd
+import numpy as np
+import time
+from numba import njit, prange
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# yfinance 已知會丟出的錯誤：自身的 YFException 與底層 curl_cffi 的連線錯誤；其餘例外（程式錯誤）不攔截
+FETCH_ERRORS = (YFException, RequestException)
+
+# --- 核心運算函數 ---
+# 抓取、指標 kernel 與分析集中在此模組，各監控頁共用同一份 JIT 編譯快取與 st.cache_data 快取
+
+@st.cache_resource
+def fetch_guard():
+    # 被 Yahoo 限流的代號進入冷卻期（指數退避），期間改回傳最後一次成功的資料
+    return {"cooldown": {}, "last_good": {}}
+
+def in_cooldown(key):
+    return fetch_guard()["cooldown"].get(key, (0.0, 0))[0] > time.time()
+
+def start_cooldown(key):
+    _, strikes = fetch_guard()["cooldown"].get(key, (0.0, 0))
+    fetch_guard()["cooldown"][key] = (time.time() + min(60 * 2 ** strikes, 900), strikes + 1)
+
+def remember(key, data):
+    guard = fetch_guard()
+    guard["cooldown"].pop(key, None)
+    guard["last_good"][key] = data
+    return data
+
+@st.cache_resource
+def yf_lock():
+    # yfinance 把下載結果與錯誤記在模組層級的 shared._DFS / _ERRORS，
+    # Ticker.history 失敗時也會寫入；同一行程內的 yfinance 呼叫必須一次只跑一個
+    return threading.Lock()
+
+def to_float32(data):
+    # 盤中短視窗的指標運算用 float32 已足夠，記憶體與頻寬減半
+    return data.astype({c: np.float32 for c in ('Open', 'High', 'Low', 'Close', 'Volume')})
+
+# 盤中 K 線每分鐘才更新一次，同一分鐘內的重跑直接重用快取，不再重複請求 Yahoo
+@st.cache_data(ttl=55, show_spinner=False)
+def fetch_data(ticker, interval):
+    key = (ticker, interval)
+    if in_cooldown(key): return fetch_guard()["last_good"].get(key)
+    try:
+        # 抓取 2 天數據以確保指標計算穩定
+        with yf_lock():
+            data = yf.Ticker(ticker).history(period="2d", interval=interval)
+    except YFRateLimitError:
+        logger.warning("%s %s 被限流，進入冷卻期", ticker, interval)
+        start_cooldown(key)
+        return fetch_guard()["last_good"].get(key)
+    except FETCH_ERRORS as e:
+        logger.warning("%s %s 下載失敗: %r", ticker, interval, e)
+        return None
+    if data.empty: return None
+    if isinstance(data.columns, pd.MultiIndex):
+        data.columns = data.columns.get_level_values(0)
+    return remember(key, to_float32(data))
+
+@st.cache_data(ttl=55, show_spinner=False)
+def fetch_batch(tickers, interval):
+    # 一次 yf.download 抓取全部代號，再依代號切出各自的 DataFrame
+    last_good = fetch_guard()["last_good"]
+    pending = [t for t in tickers if not in_cooldown((t, interval))]
+    frames = {t: last_good.get((t, interval)) for t in tickers}
+    if not pending: return frames
+    try:
+        with yf_lock():
+            data = yf.download(pending, period="2d", interval=interval, group_by="ticker", progress=False, threads=True)
+            # yf.download 會吞掉各代號的例外，只把 repr 記在 yf.shared._ERRORS；須在鎖內讀取
+            limited = {t for t, err in yf.shared._ERRORS.items() if "YFRateLimitError" in err}
+    except FETCH_ERRORS as e:
+        logger.warning("%s %s 批次下載失敗，沿用上次成功的資料: %r", pending, interval, e)
+        return frames
+    if limited: logger.warning("%s %s 被限流，進入冷卻期", sorted(limited), interval)
+    for t in pending:
+        if t in limited:
+            start_cooldown((t, interval))
+            continue
+        if data.empty or t not in data.columns.get_level_values(0):
+            frames[t] = None
+            continue
+        df = data[t].dropna(how="all")
+        frames[t] = remember((t, interval), to_float32(df)) if not df.empty else None
+    return frames
+
+@njit(cache=True)
+def compute_indicators(close, volume, a_f, a_s, vw):
+    # 單次迴圈同時算快慢 EMA（等同 ewm(adjust=False).mean()）與成交量均線
+    n = len(close)
+    ef, es, vma = np.empty_like(close), np.empty_like(close), np.empty_like(close)
+    # 成交量累加保持 float64，避免 float32 加減的誤差累積
+    s, cnt = 0.0, 0
+    for i in range(n):
+        if i == 0 or np.isnan(ef[i - 1]):
+            ef[i], es[i] = close[i], close[i]
+        elif np.isnan(close[i]):
+            # 缺值的 K 線沿用前一根的 EMA，避免 NaN 一路傳到整個視窗
+            ef[i], es[i] = ef[i - 1], es[i - 1]
+        else:
+            ef[i] = a_f * close[i] + (1 - a_f) * ef[i - 1]
+            es[i] = a_s * close[i] + (1 - a_s) * es[i - 1]
+        # 成交量均線只計入非 NaN 的量
+        if not np.isnan(volume[i]): s += volume[i]; cnt += 1
+        if i >= vw and not np.isnan(volume[i - vw]): s -= volume[i - vw]; cnt -= 1
+        vma[i] = s / cnt if i >= vw - 1 and cnt > 0 else np.nan
+    return ef, es, vma
+
+@njit(cache=True)
+def rsi_wilder(close, period=14):
+    # Wilder 平滑 RSI，回傳與 close 等長的陣列（前 period 根為 NaN）
+    n = len(close)
+    out = np.full(n, np.nan)
+    if n <= period: return out
+    delta = np.diff(close)
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    avg_g, avg_l = gain[:period].mean(), loss[:period].mean()
+    out[period] = 100.0 if avg_l == 0 else 100 - 100 / (1 + avg_g / avg_l)
+    for i in range(period, n - 1):
+        avg_g = (avg_g * (period - 1) + gain[i]) / period
+        avg_l = (avg_l * (period - 1) + loss[i]) / period
+        # 平均跌幅為 0（含整段持平）時依原本的處理回傳 100
+        out[i + 1] = 100.0 if avg_l == 0 else 100 - 100 / (1 + avg_g / avg_l)
+    return out
+
+@njit(cache=True)
+def compute_pivots(high, low, close_last):
+    # 以整個視窗的高低點與最新收盤計算樞紐點，回傳 (壓力 R1, 支撐 S1)
+    high_p, low_p = np.nanmax(high), np.nanmin(low)
+    pivot = (high_p + low_p + close_last) / 3
+    return (2 * pivot) - low_p, (2 * pivot) - high_p
+
+@njit(cache=True)
+def analyze_kernel(open_, high, low, close, volume, a_f, a_s, vw):
+    # 單一代號的全部數值運算：指標陣列 + 支撐壓力、RSI、量比、日漲跌幅
+    ef, es, vma = compute_indicators(close, volume, a_f, a_s, vw)
+    res_1, sup_1 = compute_pivots(high, low, close[-1])
+    rsi = rsi_wilder(close)[-1]
+    vol_ratio = volume[-1] / vma[-1] if vma[-1] != 0 else 1.0
+    # 薄量代號偶有開盤價為 0 的 K 線；kernel 內除以 0 會拋例外並拖垮整批分析
+    day_pct = (close[-1] - open_[-1]) / open_[-1] * 100 if open_[-1] != 0 else 0.0
+    return ef, es, vma, res_1, sup_1, rsi, vol_ratio, day_pct
+
+@njit(parallel=True, cache=True)
+def analyze_batch(open_, high, low, close, volume, offsets, a_f, a_s, vw):
+    # 所有代號的 K 線首尾相接成一維陣列，第 k 檔位於 offsets[k]:offsets[k + 1]
+    n_sym = len(offsets) - 1
+    ef, es, vma = np.empty_like(close), np.empty_like(close), np.empty_like(close)
+    scalars = np.empty((n_sym, 5))
+    for k in prange(n_sym):
+        lo, hi = offsets[k], offsets[k + 1]
+        ef_k, es_k, vma_k, res_1, sup_1, rsi, vol_ratio, day_pct = analyze_kernel(
+            open_[lo:hi], high[lo:hi], low[lo:hi], close[lo:hi], volume[lo:hi], a_f, a_s, vw)
+        ef[lo:hi], es[lo:hi], vma[lo:hi] = ef_k, es_k, vma_k
+        scalars[k, 0], scalars[k, 1], scalars[k, 2] = res_1, sup_1, rsi
+        scalars[k, 3], scalars[k, 4] = vol_ratio, day_pct
+    return ef, es, vma, scalars
+
+# 匯入時先編譯一次，避免第一次刷新承擔 JIT 編譯時間
+warm = np.ones(16, dtype=np.float32)
+analyze_batch(warm, warm, warm, warm, warm, np.array([0, 16]), 0.5, 0.5, 10)
+
+@st.cache_resource
+def batch_lock():
+    # numba 預設的 workqueue 執行緒層不允許多個執行緒同時進入平行 kernel
+    return threading.Lock()
+
+# VIX 取 2 分鐘 K 線，最快每 120 秒才變一次，直接快取計算後的結果
+@st.cache_data(ttl=110, show_spinner=False)
+def get_vix_info():
+    vix = fetch_data("^VIX", "2m")
+    if vix is None or len(vix) < 2: return 20.0, 0.0
+    curr_v = float(vix['Close'].iloc[-1])
+    v_chg = curr_v - float(vix['Close'].iloc[-2])
+    return curr_v, v_chg
+
+def bar_key(df):
+    # 最後一根 K 線的時間、價量與長度；K 線未變動時鍵值不變
+    if df is None: return None
+    return df.index[-1], float(df['Close'].iloc[-1]), float(df['Volume'].iloc[-1]), len(df)
+
+# 交叉訊號代碼：1 黃金交叉、-1 死亡交叉、0 無交叉
+CROSS_SIGNALS = {1: ("↗️ 黃金交叉", "warning"), -1: ("↘️ 死亡交叉", "error"), 0: ("趨勢穩定", "success")}
+
+def build_info(close_last, ema_f, ema_s, vol_ma, res_1, sup_1, rsi, vol_ratio, day_pct, v_chg):
+    # 把 kernel 算出的數值轉成文字訊號
+    curr_p = float(close_last)
+    prev_fast, last_fast = ema_f[-2:]
+    prev_slow, last_slow = ema_s[-2:]
+    
+    # 1. 趨勢與量能判斷
+    trend_type = "多頭 (Bullish)" if last_fast > last_slow else "空頭 (Bearish)"
+    vol_ratio = float(vol_ratio)
+    
+    if vol_ratio >= 2.0: vol_status = "🔥 爆量"
+    elif vol_ratio >= 1.5: vol_status = "⚡ 放大"
+    else: vol_status = "正常"
+
+    # 2. 警報訊息（交叉以整數旗標計算，再查表轉成文字）
+    up = int((prev_fast <= prev_slow) & (last_fast > last_slow))
+    down = int((prev_fast >= prev_slow) & (last_fast < last_slow))
+    signal_code = up - down
+    msg, alert_level = CROSS_SIGNALS[signal_code]
+    
+    if signal_code == 1 and v_chg <= 0.2: alert_level = "error"
+    elif signal_code == 0 and curr_p >= res_1 * 0.998:
+        msg = "🧱 接近壓力"; alert_level = "warning"
+
+    info = {
+        "price": curr_p,
+        "day_pct": float(day_pct),
+        "rsi": float(rsi),
+        "vol_ratio": vol_ratio,
+        "vol_status": vol_status,
+        "trend": trend_type,
+        "res": float(res_1), "sup": float(sup_1),
+        "msg": msg, "alert_level": alert_level, "signal_code": signal_code,
+        "ema_fast_arr": ema_f, "ema_slow_arr": ema_s, "vol_ma_arr": vol_ma,
+        "last_fast": float(last_fast), "prev_fast": float(prev_fast),
+        "last_slow": float(last_slow), "prev_slow": float(prev_slow)
+    }
+    return info
+
+# _frames 不參與雜湊，以各代號的 bar_key 代表資料內容；K 線未變動的重跑直接取回分析結果
+@st.cache_data(ttl=55, show_spinner=False)
+def analyze_all_symbols(symbols, interval, bars, _frames, v_chg, alpha_f, alpha_s):
+    results = {sym: None for sym in symbols}
+    valid = [sym for sym in dict.fromkeys(symbols) if _frames[sym] is not None and len(_frames[sym]) >= 25]
+    if not valid: return results
+
+    # 1. 全部代號接成一維陣列，一次送進平行 kernel
+    cols = {c: np.concatenate([_frames[sym][c].to_numpy(dtype=np.float32) for sym in valid])
+            for c in ('Open', 'High', 'Low', 'Close', 'Volume')}
+    offsets = np.concatenate(([0], np.cumsum([len(_frames[sym]) for sym in valid])))
+
+    with batch_lock():
+        ema_f, ema_s, vol_ma, scalars = analyze_batch(
+            cols['Open'], cols['High'], cols['Low'], cols['Close'], cols['Volume'], offsets, alpha_f, alpha_s, 10)
+
+    # 2. 拆回各代號並轉成文字訊號
+    for k, sym in enumerate(valid):
+        lo, hi = offsets[k], offsets[k + 1]
+        close = cols['Close'][lo:hi]
+        results[sym] = build_info(close[-1], ema_f[lo:hi], ema_s[lo:hi], vol_ma[lo:hi], *scalars[k], v_chg)
+    return results
@@ -1,89 +1,61 @@
 import streamlit as st
-import yfinance as yf
-import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import time
+from streamlit_autorefresh import st_autorefresh
+from indicators import analyze_all_symbols, bar_key, fetch_batch, get_vix_info
 
 # --- 頁面配置 ---
 st.set_page_config(page_title="專業級多股實時監控", layout="wide")
 st.title("🚀 專業實時監控 (摘要含量能與趨勢資訊)")
+# 每 60 秒由前端觸發一次重跑，不再用 while True 佔住執行緒
+st_autorefresh(interval=60_000, key="tick")
 
-# --- 核心運算函數 ---
-def fetch_data(ticker, interval):
-    try:
-        # 抓取 2 天數據以確保指標計算穩定
-        data = yf.download(ticker, period="2d", interval=interval, progress=False)
-        if data.empty: return None
-        if isinstance(data.columns, pd.MultiIndex):
-            data.columns = data.columns.get_level_values(0)
-        return data
-    except:
-        return None
+# --- 圖表 ---
+# 每張 WebGL 圖各佔一個 GL context，瀏覽器同時可用的數量有限（Chrome 約 16，行動裝置 / Safari 更少），
+# 超量時最早的圖會無聲變白；監控代號超過此數量時改回 SVG 的 Candlestick
+WEBGL_MAX_CHARTS = 8
 
-def calculate_rsi(series, period=14):
-    delta = series.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=period).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=period).mean()
-    if loss.iloc[-1] == 0: return 100.0
-    rs = gain / loss
-    return 100 - (100 / (1 + rs))
+def update_chart(sym, df, info, use_gl):
+    # 圖表物件存在 session_state 重複使用，刷新時只替換資料，不重建子圖與版面
+    # use_gl 時 K 線以 WebGL (Scattergl) 繪製：影線與實體都以誤差線表示，避免每根 K 線一個 SVG 元素
+    fig_key = f"fig_{sym}_{'gl' if use_gl else 'svg'}"
+    fig = st.session_state.get(fig_key)
+    if fig is None:
+        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.7, 0.3], vertical_spacing=0.03)
+        if use_gl:
+            fig.add_trace(go.Scattergl(mode="markers", marker=dict(size=0), hoverinfo="skip",
+                                       error_y=dict(type="data", thickness=1, width=0, color="gray")), row=1, col=1)
+            for color in ('green', 'red'):
+                fig.add_trace(go.Scattergl(mode="markers", marker=dict(size=0), name="K",
+                                           hovertemplate="O %{customdata[0]:.2f} H %{customdata[1]:.2f} L %{customdata[2]:.2f} C %{customdata[3]:.2f}",
+                                           error_y=dict(type="data", thickness=4, width=0, color=color)), row=1, col=1)
+            fig.add_trace(go.Scattergl(mode="lines", name="Fast", line=dict(color='orange', width=1)), row=1, col=1)
+        else:
+            fig.add_trace(go.Candlestick(name="K"), row=1, col=1)
+            fig.add_trace(go.Scatter(name="Fast", line=dict(color='orange', width=1)), row=1, col=1)
+        fig.add_trace(go.Bar(), row=2, col=1)
+        fig.update_layout(height=350, margin=dict(t=0, b=0), xaxis_rangeslider_visible=False, showlegend=False)
+        st.session_state[fig_key] = fig
 
-def get_vix_info():
-    vix = fetch_data("^VIX", "2m")
-    if vix is None or len(vix) < 2: return 20.0, 0.0
-    curr_v = float(vix['Close'].iloc[-1])
-    v_chg = curr_v - float(vix['Close'].iloc[-2])
-    return curr_v, v_chg
+    o, h, l, c = (df[col].to_numpy() for col in ('Open', 'High', 'Low', 'Close'))
+    down = c < o
+    if use_gl:
+        fig.data[0].update(x=df.index, y=(h + l) / 2, error_y_array=(h - l) / 2)
+        ohlc = np.column_stack((o, h, l, c))
+        for trace, mask in ((fig.data[1], ~down), (fig.data[2], down)):
+            trace.update(x=df.index[mask], y=((o + c) / 2)[mask], error_y_array=(np.abs(c - o) / 2)[mask], customdata=ohlc[mask])
+    else:
+        fig.data[0].update(x=df.index, open=o, high=h, low=l, close=c)
+    fig.data[-2].update(x=df.index, y=info['ema_fast_arr'])
+    v_colors = np.where(down, 'red', 'green').tolist()
+    fig.data[-1].update(x=df.index, y=df['Volume'], marker_color=v_colors)
 
-def analyze_stock(df, v_chg, ema_fast_val, ema_slow_val):
-    if df is None or len(df) < 25: return None, None
-    
-    # 1. 支撐壓力計算
-    high_p, low_p, close_p = float(df['High'].max()), float(df['Low'].min()), float(df['Close'].iloc[-1])
-    pivot = (high_p + low_p + close_p) / 3
-    res_1, sup_1 = (2 * pivot) - low_p, (2 * pivot) - high_p
-
-    # 2. 技術指標
-    df['EMA_F'] = df['Close'].ewm(span=ema_fast_val, adjust=False).mean()
-    df['EMA_S'] = df['Close'].ewm(span=ema_slow_val, adjust=False).mean()
-    df['RSI'] = calculate_rsi(df['Close'])
-    df['Vol_MA'] = df['Volume'].rolling(window=10).mean()
-    
-    last, prev = df.iloc[-1], df.iloc[-2]
-    curr_p = float(last['Close'])
-    
-    # 3. 趨勢與量能判斷
-    trend_type = "多頭 (Bullish)" if last['EMA_F'] > last['EMA_S'] else "空頭 (Bearish)"
-    vol_ratio = float(last['Volume'] / last['Vol_MA']) if last['Vol_MA'] != 0 else 1.0
-    
-    if vol_ratio >= 2.0: vol_status = "🔥 爆量"
-    elif vol_ratio >= 1.5: vol_status = "⚡ 放大"
-    else: vol_status = "正常"
-
-    # 4. 警報訊息
-    msg = "趨勢穩定"
-    alert_level = "success"
-    
-    # 交叉邏輯
-    if prev['EMA_F'] <= prev['EMA_S'] and last['EMA_F'] > last['EMA_S']:
-        msg = "↗️ 黃金交叉"; alert_level = "warning" if v_chg > 0.2 else "error"
-    elif prev['EMA_F'] >= prev['EMA_S'] and last['EMA_F'] < last['EMA_S']:
-        msg = "↘️ 死亡交叉"; alert_level = "error"
-    elif curr_p >= res_1 * 0.998:
-        msg = "🧱 接近壓力"; alert_level = "warning"
-
-    info = {
-        "price": curr_p,
-        "day_pct": ((curr_p - df['Open'].iloc[-1]) / df['Open'].iloc[-1]) * 100,
-        "rsi": float(last['RSI']),
-        "vol_ratio": vol_ratio,
-        "vol_status": vol_status,
-        "trend": trend_type,
-        "res": res_1, "sup": sup_1,
-        "msg": msg, "alert_level": alert_level
-    }
-    return df, info
+    # 壓力、支撐線隨資料移動，清掉舊線後重畫
+    fig.layout.shapes, fig.layout.annotations = (), ()
+    fig.add_hline(y=info['res'], line_dash="dash", line_color="red", annotation_text="壓", row=1, col=1)
+    fig.add_hline(y=info['sup'], line_dash="dash", line_color="green", annotation_text="支", row=1, col=1)
+    return fig
 
 # --- 介面配置 ---
 st.sidebar.header("監控參數")
@@ -92,64 +64,60 @@ interval = st.sidebar.selectbox("頻率", ("1m", "2m", "5m"), index=0)
 ema_f_v = st.sidebar.slider("快速 EMA", 5, 20, 9)
 ema_s_v = st.sidebar.slider("慢速 EMA", 21, 50, 21)
 
-placeholder = st.empty()
+# EMA 平滑係數只在滑桿變動時重算
+if st.session_state.get("_ema_key") != (ema_f_v, ema_s_v):
+    st.session_state["_ema_key"] = (ema_f_v, ema_s_v)
+    st.session_state["_alpha_f"] = 2 / (ema_f_v + 1)
+    st.session_state["_alpha_s"] = 2 / (ema_s_v + 1)
 
-while True:
-    with placeholder.container():
-        # VIX 狀態
-        v_val, v_chg = get_vix_info()
-        v_col1, v_col2 = st.columns([1, 4])
-        v_col1.metric("VIX 指數", f"{v_val:.2f}", f"{v_chg:.2f}", delta_color="inverse")
-        with v_col2:
-            st.info(f"系統環境：VIX {'上升中，建議保守' if v_chg > 0 else '平穩，有利技術面操作'}")
+# yfinance 呼叫在 indicators.yf_lock 下依序執行（共用模組層級狀態，無法安全並行）
+v_val, v_chg = get_vix_info()
+raw = fetch_batch(tuple(symbols), interval)
 
-        # 1. 強化版即時警報摘要
-        st.subheader("🔔 即時警報摘要 (含趨勢與量能)")
-        cols = st.columns(len(symbols))
-        stock_data_store = {}
+# VIX 狀態
+v_col1, v_col2 = st.columns([1, 4])
+v_col1.metric("VIX 指數", f"{v_val:.2f}", f"{v_chg:.2f}", delta_color="inverse")
+with v_col2:
+    st.info(f"系統環境：VIX {'上升中，建議保守' if v_chg > 0 else '平穩，有利技術面操作'}")
 
-        for idx, sym in enumerate(symbols):
-            df_raw = fetch_data(sym, interval)
-            df, info = analyze_stock(df_raw, v_chg, ema_f_v, ema_s_v)
-            stock_data_store[sym] = (df, info)
+# 1. 強化版即時警報摘要
+st.subheader("🔔 即時警報摘要 (含趨勢與量能)")
+cols = st.columns(len(symbols))
+infos = analyze_all_symbols(tuple(symbols), interval, tuple(bar_key(raw[sym]) for sym in symbols), raw, v_chg,
+                            st.session_state["_alpha_f"], st.session_state["_alpha_s"])
+stock_data_store = {}
+
+for idx, sym in enumerate(symbols):
+    df_raw, info = raw[sym], infos[sym]
+    stock_data_store[sym] = (df_raw, info)
+    
+    with cols[idx]:
+        if info:
+            # 顯示狀態卡片
+            if info['alert_level'] == "error": st.error(f"**{sym} | {info['msg']}**")
+            elif info['alert_level'] == "warning": st.warning(f"**{sym} | {info['msg']}**")
+            else: st.success(f"**{sym} | 監控中**")
             
-            with cols[idx]:
-                if info:
-                    # 顯示狀態卡片
-                    if info['alert_level'] == "error": st.error(f"**{sym} | {info['msg']}**")
-                    elif info['alert_level'] == "warning": st.warning(f"**{sym} | {info['msg']}**")
-                    else: st.success(f"**{sym} | 監控中**")
-                    
-                    # 注入關鍵資訊內容
-                    st.markdown(f"**量能狀態:** {info['vol_status']}")
-                    st.markdown(f"**趨勢:** {info['trend']}")
-                    st.caption(f"RSI: {info['rsi']:.1f} | 價: {info['price']:.2f}")
-                else:
-                    st.write(f"{sym} 載入失敗")
+            # 注入關鍵資訊內容
+            st.markdown(f"**量能狀態:** {info['vol_status']}")
+            st.markdown(f"**趨勢:** {info['trend']}")
+            st.caption(f"RSI: {info['rsi']:.1f} | 價: {info['price']:.2f}")
+        else:
+            st.write(f"{sym} 載入失敗")
 
-        st.divider()
-        
-        # 2. 詳細圖表區
-        for sym in symbols:
-            df, info = stock_data_store[sym]
-            if df is not None:
-                with st.expander(f"查看 {sym} 詳情分析圖表", expanded=True):
-                    c1, c2 = st.columns([1, 4])
-                    with c1:
-                        st.metric("當前價格", f"{info['price']:.2f}", f"{info['day_pct']:.2f}%")
-                        st.write(f"壓力位: `{info['res']:.2f}`")
-                        st.write(f"支撐位: `{info['sup']:.2f}`")
-                    with c2:
-                        fig = make_subplots(rows=2, cols=1, shared_xaxes=True, row_heights=[0.7, 0.3], vertical_spacing=0.03)
-                        fig.add_trace(go.Candlestick(x=df.index, open=df['Open'], high=df['High'], low=df['Low'], close=df['Close'], name="K"), row=1, col=1)
-                        fig.add_hline(y=info['res'], line_dash="dash", line_color="red", annotation_text="壓", row=1, col=1)
-                        fig.add_hline(y=info['sup'], line_dash="dash", line_color="green", annotation_text="支", row=1, col=1)
-                        fig.add_trace(go.Scatter(x=df.index, y=df['EMA_F'], name="Fast", line=dict(color='orange', width=1)), row=1, col=1)
-                        
-                        v_colors = ['red' if df['Close'].iloc[i] < df['Open'].iloc[i] else 'green' for i in range(len(df))]
-                        fig.add_trace(go.Bar(x=df.index, y=df['Volume'], marker_color=v_colors), row=2, col=1)
-                        fig.update_layout(height=350, margin=dict(t=0, b=0), xaxis_rangeslider_visible=False, showlegend=False)
-                        st.plotly_chart(fig, use_container_width=True)
+st.divider()
 
-        time.sleep(60)
-        st.rerun()
+# 2. 詳細圖表區
+use_gl = len(symbols) <= WEBGL_MAX_CHARTS
+for sym in symbols:
+    df, info = stock_data_store[sym]
+    if info is not None:
+        with st.expander(f"查看 {sym} 詳情分析圖表", expanded=True):
+            c1, c2 = st.columns([1, 4])
+            with c1:
+                st.metric("當前價格", f"{info['price']:.2f}", f"{info['day_pct']:.2f}%")
+                st.write(f"壓力位: `{info['res']:.2f}`")
+                st.write(f"支撐位: `{info['sup']:.2f}`")
+            with c2:
+                fig = update_chart(sym, df, info, use_gl)
+                st.plotly_chart(fig, use_container_width=True, key=f"chart_{sym}")